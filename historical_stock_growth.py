@@ -1,17 +1,35 @@
 MARKET_FOR_HOLIDAYS = 'NASDAQ'  # Market holidays are based on holidays for this market
+CACHE_DIR = '~/.cache/historical_stock_growth'  # Data reused across runs is stored here
+HOLIDAYS_CACHE_MAX_AGE_DAYS = 30  # Cached market holidays older than this are fetched again
+CLOSE_PRICES_CACHE_MAX_AGE_SECONDS = 60*60  # Cached close prices older than this are fetched again
+YAHOO_CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/{ticker}'  # Used directly when fetching asynchronously
+YAHOO_USER_AGENT = 'Mozilla/5.0'  # Yahoo rejects requests without a browser-like user agent
 
 
 import argparse
 import sys
 import os
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+import time
+import pickle
+import hashlib
+import asyncio
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import yfinance as yf
 import pandas_market_calendars as mcal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+try:
+    import pyarrow as pa  # Optional, used to write the output CSV faster
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+try:
+    import aiohttp  # Optional, used to fetch data asynchronously
+except ImportError:
+    aiohttp = None
 import functools
-print = functools.partial(print, flush=True)  # Prevent print statements from buffering till end of execution
+sys.stdout.reconfigure(line_buffering=True)  # Prevent print statements from buffering till end of execution
 
 
 
@@ -28,6 +46,13 @@ def parse_and_validate_args():
     parser.add_argument("periods",
                             nargs='*',
                             help="numbers of days or years to find growth over, e.g.: 30 90 360 2y 5y")
+    parser.add_argument("-w", "--max_workers",
+                            type=int,
+                            default=8,
+                            help="maximum number of tickers to fetch data for at the same time (default: 8)")
+    parser.add_argument("-a", "--async_fetch",
+                            action='store_true',
+                            help="fetch data straight from Yahoo asynchronously with aiohttp instead of through yfinance")
 
     args = parser.parse_args()
 
@@ -40,6 +65,12 @@ def parse_and_validate_args():
         parser.print_help()
         sys.exit(f"\n\nExiting.\n")
 
+    if args.max_workers < 1:
+        sys.exit(f"\nERROR: max_workers argument '{args.max_workers}' is invalid. It must be at least 1.\n\nExiting.\n")
+
+    if args.async_fetch and aiohttp is None:
+        sys.exit("\nERROR: async_fetch argument requires the aiohttp package, which is not installed.\n\nExiting.\n")
+
     args.year_periods = []
     args.day_periods = []
     for period_idx, period in enumerate(args.periods):
@@ -58,144 +89,337 @@ def parse_and_validate_args():
 
 def get_dates(args):
 
-    dates = []
+    today = pd.Timestamp.today().normalize()  # Drop time of day, dates are kept as a DatetimeIndex until written out
 
-    for num_days in args.day_periods:
-        dates.append(datetime.today() - timedelta(days=num_days))
-    for num_years in args.year_periods:
-        dates.append(datetime.today() - relativedelta(years=num_years))
+    day_dates  = today - pd.to_timedelta(args.day_periods, unit='D')
+    year_dates = pd.DatetimeIndex([today - pd.DateOffset(years=num_years) for num_years in args.year_periods])
 
-    dates = [date.strftime('%Y-%m-%d') for date in dates]  # Convert dates to strings
-    dates.sort(reverse=True)  # Sort dates starting with most recent
+    dates = day_dates.append(year_dates).sort_values(ascending=False)  # Sort dates starting with most recent
 
     return dates
 
 
 def open_and_read_tickers_file(args):
 
-    file = open(args.ticker_list_filepath)
-    tickers = file.readlines()
-    file.close()
+    try:
+        tickers = pd.read_csv(args.ticker_list_filepath, header=None, dtype=str, comment='#', keep_default_na=False)[0]  # Anything after a '#' is ignored; tickers like 'NA' aren't treated as missing
+    except pd.errors.EmptyDataError:
+        tickers = pd.Series([], dtype=str)
+
+    tickers = tickers.dropna().str.strip().str.upper()  # Remove any leading or trailing whitespace and normalize case
+    tickers = tickers[tickers.ne('')].drop_duplicates().tolist()  # Fetch each ticker only once
 
-    tickers = [ticker.strip() for ticker in tickers]  # Remove any leading or trailing whitespace
+    if tickers == []:
+        sys.exit(f"\nERROR: Ticker list file '{args.ticker_list_filepath}' does not contain any tickers.\n\nExiting.\n")
     
     return tickers
 
 
-# TODO: This function is slow, profile to see how it can be improved. Probably not much the slow part is probably: ticker_data = yf.Ticker(ticker)
-def get_prices(dates, tickers):
+def get_prices(dates, tickers, max_workers, async_fetch):
 
-    # yfinance's history() 'end' argument must be 1 day after the start to get just the data for the start date, so get those end dates
-    end_dates = [(datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d') for date in dates]  # Subtract one day from each date
+    # yfinance's history() 'end' argument must be 1 day after the start to get the data for the start date, so end 1 day after the latest date
+    earliest_date = dates.min()
+    latest_date = dates.max() + pd.Timedelta(days=1)
 
     current_label = datetime.now().strftime('%Y-%m-%d %H:%M') + ' price'
     start_column_labels = ['ticker', 'name', current_label]
     global num_start_cols
     num_start_cols = len(start_column_labels)
-    tmp_column_labels = start_column_labels + dates
-    df = pd.DataFrame(columns=tmp_column_labels)
-
+    date_column_labels = list(dates.strftime('%Y-%m-%d') + ' close')
+
+    if async_fetch:
+        # Get every ticker's history, current price and name straight from Yahoo's chart endpoint, all at once
+        print(f"\n  Getting data for {len(tickers)} tickers...")
+        close_prices, ticker_info = asyncio.run(get_prices_async(tickers, dates, earliest_date, latest_date, max_workers))
+    else:
+        # Get every ticker's history spanning all dates in one batched request, unless a recent run already did
+        close_prices = load_cached_close_prices(tickers, dates)
+        if close_prices is None:
+            print(f"\n  Getting price history for {len(tickers)} tickers...")
+            close_prices = get_close_prices(tickers, dates, earliest_date, latest_date)
+            if not np.isnan(close_prices).any():  # yfinance returns NaN rather than raising when fetching fails, so only cache complete results
+                save_cached_close_prices(tickers, dates, close_prices)
+        else:
+            print(f"\n  Using cached price history for {len(tickers)} tickers.")
+
+        # Current price and name are fetched independently per ticker over the network, so fetch several tickers at once
+        ticker_info = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(get_ticker_info, ticker): ticker for ticker in tickers}
+            for future_idx, future in enumerate(as_completed(futures)):
+                ticker = futures[future]
+                # A failed ticker, e.g. a delisted symbol, only loses its own current price and name rather than aborting the run
+                try:
+                    ticker_info[ticker] = future.result()
+                except Exception as error:
+                    print(f"\n  Request for {ticker} failed: {error!r}")
+                    ticker_info[ticker] = (None, np.nan)
+                    continue
+                print(f"\n  Got data for {ticker} ({future_idx+1}/{len(futures)}).")
+
+    for date_idx, ticker_idx in np.argwhere(np.isnan(close_prices)):
+        ticker = tickers[ticker_idx]
+        timestamp = int(dates[date_idx].timestamp())
+        timestamp1 = timestamp - 60*60*24*3  # 3 days before
+        timestamp2 = timestamp + 60*60*24*3  # 3 days ahead
+        print(f"  No data found for {ticker} on {dates[date_idx]:%Y-%m-%d}, see: https://finance.yahoo.com/quote/{ticker}/history?period1={timestamp1}&period2={timestamp2}.")
+
+    # Keep all prices in one float64 array, with a row for each ticker in the order they were listed in, holding its current price then its close prices
+    prices = np.empty((len(tickers), 1 + len(dates)), dtype=np.float64)
+    prices[:, 1:] = close_prices.T
+    names = []
     for ticker_idx, ticker in enumerate(tickers):
+        name, prices[ticker_idx, 0] = ticker_info[ticker]
+        names.append(name)
 
-        print(f"\n  Getting data for {ticker} ({ticker_idx+1}/{len(tickers)})...")
-        ticker_data = yf.Ticker(ticker)
+    column_labels = start_column_labels + date_column_labels
 
-        close_vals = []
+    return names, prices, column_labels
 
-        for date_idx, date in enumerate(dates):
-            vals_on_date_df = ticker_data.history(period='1d', start=date, end=end_dates[date_idx], debug=False)
-            
-            if not vals_on_date_df.empty:
-                close_vals.append(vals_on_date_df['Close'].iloc[0])
-            else:
-                timestamp = int(datetime.strptime(date, "%Y-%m-%d").timestamp())
-                timestamp1 = timestamp - 60*60*24*3  # 3 days before
-                timestamp2 = timestamp + 60*60*24*3  # 3 days ahead
-                print(f"  No data found for {ticker} on {date}, see: https://finance.yahoo.com/quote/{ticker}/history?period1={timestamp1}&period2={timestamp2}.")
-                
-                close_vals.append(np.NaN)
-
-        # current_price = ticker_data.info['regularMarketPrice']
-        current_price = ticker_data.info['ask']
+
+# Get array of close prices with a row for each date and a column for each ticker
+def get_close_prices(tickers, dates, earliest_date, latest_date):
+
+    history_df = yf.download(tickers, start=earliest_date, end=latest_date, group_by='ticker', auto_adjust=True, threads=True, progress=False)
+
+    if history_df.empty:
+        close_prices_df = pd.DataFrame(np.nan, index=dates, columns=tickers)
+    else:
+        if isinstance(history_df.columns, pd.MultiIndex):
+            close_prices_df = history_df.xs('Close', axis=1, level=1)
+        else:
+            close_prices_df = history_df[['Close']].set_axis(tickers[:1], axis=1)  # Some yfinance versions don't group a single ticker's columns
+        close_prices_df.index = close_prices_df.index.tz_localize(None).normalize()  # Drop time of day so index matches dates
+        close_prices_df = close_prices_df.reindex(columns=tickers).reindex(dates, method='ffill')
+
+    return close_prices_df.to_numpy(dtype=np.float64)
+
+
+# Get path of the file caching close prices for these tickers and dates
+def get_close_prices_cache_file_path(tickers, dates):
+
+    key = ','.join(tickers) + '|' + ','.join(dates.strftime('%Y-%m-%d'))
+    key_hash = hashlib.sha1(key.encode()).hexdigest()
+
+    return os.path.join(os.path.expanduser(CACHE_DIR), f"close_prices_{key_hash}.npy")
+
+
+# Get close prices saved by a recent run for the same tickers and dates, or None if there aren't any
+def load_cached_close_prices(tickers, dates):
+
+    cache_file_path = get_close_prices_cache_file_path(tickers, dates)
+
+    if os.path.isfile(cache_file_path):
+        cache_age_seconds = time.time() - os.path.getmtime(cache_file_path)
+        if cache_age_seconds < CLOSE_PRICES_CACHE_MAX_AGE_SECONDS:
+            try:
+                close_prices = np.load(cache_file_path, allow_pickle=False)
+                if close_prices.shape == (len(dates), len(tickers)):
+                    return close_prices
+            except Exception:
+                pass  # Cache file is unreadable, so fetch close prices again
+
+    return None
+
+
+def save_cached_close_prices(tickers, dates, close_prices):
+
+    cache_file_path = get_close_prices_cache_file_path(tickers, dates)
+    cache_dir = os.path.dirname(cache_file_path)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_file_path, close_prices, allow_pickle=False)
+
+        # Dates change daily, so each day's runs use a new file; remove old ones that can no longer be used
+        for file_name in os.listdir(cache_dir):
+            file_path = os.path.join(cache_dir, file_name)
+            if file_name.startswith('close_prices_') and file_name.endswith('.npy'):
+                if time.time() - os.path.getmtime(file_path) >= CLOSE_PRICES_CACHE_MAX_AGE_SECONDS:
+                    os.remove(file_path)
+    except Exception:
+        pass  # Caching is only an optimization, so carry on without it
+
+
+def get_ticker_info(ticker):
+
+    ticker_data = yf.Ticker(ticker)  # yfinance reuses one browser-impersonating keep-alive session across all calls
+
+    # fast_info and the history metadata come from the light chart endpoint, so only fall back to the full quote summary in info when they lack a value
+    current_price = ticker_data.fast_info['last_price']  # Also fills the history metadata read for the name below, so no extra request is made
+    if current_price is None:
+        current_price = ticker_data.info['regularMarketPrice']
+
+    name = ticker_data.history_metadata.get('longName')
+    if name is None:
         name = ticker_data.info['longName']
-        df.loc[len(df)] = [ticker, name, current_price] + close_vals
-        
-    # Some different dates may have been used, so fix column labels
-    date_column_labels = [date + ' close' for date in dates]
-    df.columns = start_column_labels + date_column_labels
 
-    return df
+    return name, current_price
+
+
+# Get array of close prices like get_close_prices, and each ticker's name and current price like get_ticker_info, without going through yfinance
+async def get_prices_async(tickers, dates, earliest_date, latest_date, max_connections):
+
+    params = {'period1': int(earliest_date.timestamp()), 'period2': int(latest_date.timestamp()), 'interval': '1d', 'events': 'div,splits'}
+    market_days = dates.to_numpy().astype('datetime64[D]')
+    connector = aiohttp.TCPConnector(limit=max_connections)
+
+    async with aiohttp.ClientSession(connector=connector, headers={'User-Agent': YAHOO_USER_AGENT}) as session:
+        ticker_results = await asyncio.gather(*[get_chart_async(session, ticker, params, market_days) for ticker in tickers])
+
+    close_prices = np.full((len(dates), len(tickers)), np.nan)
+    ticker_info = {}
+
+    for ticker_idx, (ticker, ticker_result) in enumerate(zip(tickers, ticker_results)):
+        if ticker_result is None:
+            ticker_info[ticker] = (None, np.nan)
+        else:
+            name, current_price, close_prices[:, ticker_idx] = ticker_result
+            ticker_info[ticker] = (name, current_price)
+
+    return close_prices, ticker_info
+
+
+# Get ticker's name, current price and close price on each market day, or None if the request fails
+async def get_chart_async(session, ticker, params, market_days):
+
+    # A failed request or unexpected response only loses this ticker's data rather than aborting every other request
+    try:
+        async with session.get(YAHOO_CHART_URL.format(ticker=ticker), params=params) as response:
+            if response.status != 200:
+                print(f"\n  Request for {ticker} failed: HTTP status {response.status}")
+                return None
+            chart = await response.json()
+        ticker_result = parse_chart(chart, market_days)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, IndexError, TypeError) as error:
+        print(f"\n  Request for {ticker} failed: {error!r}")
+        return None
+
+    if ticker_result is None:
+        print(f"\n  Request for {ticker} failed: no chart data returned")
+    else:
+        print(f"\n  Got data for {ticker}.")
+
+    return ticker_result
+
+
+def parse_chart(chart, market_days):
+
+    results = chart['chart']['result']
+    if not results:
+        return None
+
+    meta = results[0]['meta']
+    close_vals = np.full(len(market_days), np.nan)
+
+    timestamps = results[0].get('timestamp', [])
+    if timestamps != []:
+
+        # Timestamps are in UTC, so shift them to the exchange's time zone to get each market day
+        history_days = (np.array(timestamps, dtype=np.int64) + meta['gmtoffset']).astype('datetime64[s]').astype('datetime64[D]')
+        indicators = results[0]['indicators']
+        if 'adjclose' in indicators:
+            history_closes = np.array(indicators['adjclose'][0]['adjclose'], dtype=float)  # Same adjusted close yfinance gives
+        else:
+            history_closes = np.array(indicators['quote'][0]['close'], dtype=float)
+
+        # Drop days with a null close, like yf.download does, so those dates get the previous close as in the yfinance path
+        has_close = ~np.isnan(history_closes)
+        history_days, history_closes = history_days[has_close], history_closes[has_close]
+
+        # Use the close price of the latest market day on or before each date
+        if history_closes.size > 0:
+            history_idxs = np.searchsorted(history_days, market_days, side='right') - 1
+            close_vals = np.where(history_idxs >= 0, history_closes[history_idxs], np.nan)
+
+    return meta.get('longName'), meta.get('regularMarketPrice', np.nan), close_vals
 
 
 # If the specified date was a weekend day or market holiday, use the next previous market day instead
 def check_dates(dates):
 
-    market_holidays = mcal.get_calendar(MARKET_FOR_HOLIDAYS).holidays().holidays
-    market_holidays = [pd.to_datetime(holiday).strftime('%Y-%m-%d') for holiday in market_holidays]
-    
-    for date_idx, date in enumerate(dates):
+    market_holidays = get_market_holidays(MARKET_FOR_HOLIDAYS)
 
-        while((date in market_holidays) or (datetime.strptime(date, "%Y-%m-%d").weekday() > 4)):  # weekday() returns 0-4 for Monday-Friday
-            print(f"  {date} was on a weekend or was a market holiday. Using ", end="")
-            date = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')  # Subtract one day
-            print(f"{date}.")
+    # Get all market days up to the latest date, starting far enough back that every date has a market day on or before it
+    market_days = pd.bdate_range(dates.min() - pd.Timedelta(days=14), dates.max(), freq='C', holidays=market_holidays)
 
-        dates[date_idx] = date
+    # Map every date to the latest market day on or before it in one lookup
+    market_dates = market_days[market_days.searchsorted(dates, side='right') - 1]
 
-    return dates
+    for date, market_date in zip(dates, market_dates):
+        if date != market_date:
+            print(f"  {date:%Y-%m-%d} was on a weekend or was a market holiday. Using {market_date:%Y-%m-%d}.")
 
+    return market_dates
 
-def calculate_returns(df):
 
-    # Get dataframe of return values
-    returns_df = df.apply(calculate_return_row, axis=1)
-    
-    # Append returns df to close prices df
-    df = pd.concat([df, returns_df], axis=1).sort_index(axis=1, ascending=False)
-    
-    # Rearrange columns so that close price precedes each respective return value
-    return_cols = df.columns[num_start_cols::2]
-    close_cols  = df.columns[num_start_cols+1::2]
-    reordered_cols = list(df.columns[0:num_start_cols])
-    reordered_cols = reordered_cols + [col for idx, _ in enumerate(return_cols) for col in [close_cols[idx], return_cols[idx]]]
-    df = df[reordered_cols]
+@functools.lru_cache(maxsize=None)
+def get_market_holidays(market):
 
-    return df
+    cache_dir = os.path.expanduser(CACHE_DIR)
+    cache_file_path = os.path.join(cache_dir, f"{market.lower()}_holidays.pkl")
 
+    # Use holidays saved by a previous run if they are recent enough, since getting them from the calendar is slow
+    if os.path.isfile(cache_file_path):
+        cache_age_days = (time.time() - os.path.getmtime(cache_file_path)) / (60*60*24)
+        if cache_age_days < HOLIDAYS_CACHE_MAX_AGE_DAYS:
+            try:
+                with open(cache_file_path, 'rb') as file:
+                    return pickle.load(file)
+            except Exception:
+                pass  # Cache file is unreadable, e.g. written by an older version, so get holidays from the calendar below
 
-def calculate_return_row(row: pd.Series):
+    # Store as ISO date strings so the cache file doesn't depend on numpy's pickled internals
+    market_holidays = tuple(pd.DatetimeIndex(mcal.get_calendar(market).holidays().holidays).strftime('%Y-%m-%d'))
 
-    price_idx = [idx for idx, label in enumerate(list(row.index)) if 'price' in label][0]
-    current_price = row[price_idx]
-    close_prices  = row[num_start_cols:]
-    
-    returns = [calculate_return(current_price, close_price) for close_price in close_prices]
-    index = [label.replace('close', 'return') for label in row.index[num_start_cols:]]
-    returns = pd.Series(returns, index=index)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file_path, 'wb') as file:
+            pickle.dump(market_holidays, file)
+    except Exception:
+        pass  # Caching is only an optimization, so carry on without it
 
-    return returns
+    return market_holidays
 
 
-def calculate_return(current_val, initial_val):
+def calculate_returns(tickers, names, prices, column_labels):
 
-    return (current_val - initial_val) / initial_val * 100
+    # Get array of return values, computed for all tickers and dates at once straight from the prices array
+    current_prices = prices[:, [0]]  # Column vector, broadcasts across close prices
+    close_prices   = prices[:, 1:]
 
+    returns = (current_prices - close_prices) / close_prices * 100
 
-def append_period_headers(df):
+    # Interleave prices and returns in one float64 array, with close price preceding each respective return value
+    values = np.empty((len(tickers), 1 + 2*close_prices.shape[1]), dtype=np.float64)
+    values[:, 0]    = prices[:, 0]
+    values[:, 1::2] = close_prices
+    values[:, 2::2] = returns
 
-    now = datetime.now()
-    dates = [datetime.strptime(col_name[0:10], '%Y-%m-%d') for col_name in list(df.columns)[num_start_cols:]]
+    close_labels  = column_labels[num_start_cols:]
+    return_labels = [label.replace('close', 'return') for label in close_labels]
+    value_labels  = [column_labels[num_start_cols-1]] + [label for labels in zip(close_labels, return_labels) for label in labels]
 
-    num_days_list = [(now - date).days for date in dates]
+    # Only now merge the numeric values with the ticker and name columns into a df
+    df = pd.DataFrame(values, columns=value_labels)
+    df.insert(0, column_labels[0], tickers)
+    df.insert(1, column_labels[1], names)
 
-    period_headers = [''] * num_start_cols
+    return df
 
-    for num_days in num_days_list:
-        if num_days >= 365:
-            num_years = round(num_days/365.25, 1)  # Round to 1 decimal place; .25 to account for leap years
-            period_headers.append(f"{num_years} years")
-        else:
-            period_headers.append(f"{num_days} days")
+
+def append_period_headers(df):
+
+    now = pd.Timestamp.now()
+    dates = pd.to_datetime([col_name[0:10] for col_name in df.columns[num_start_cols:]], format='%Y-%m-%d')
+
+    num_days = (now - dates).days.to_numpy()
+    num_years = np.round(num_days/365.25, 1)  # Round to 1 decimal place; .25 to account for leap years
+
+    period_headers = np.where(num_days >= 365,
+                              np.char.add(num_years.astype(str), ' years'),
+                              np.char.add(num_days.astype(str), ' days'))
+    period_headers = [''] * num_start_cols + period_headers.tolist()
     
     period_df = pd.DataFrame([period_headers])
     period_df.columns = df.columns
@@ -209,16 +433,28 @@ def append_period_headers(df):
 def drop_close_prices(args, df):
     
     if not args.include_close_prices:
-        cols = df.columns
-        cols_to_keep = [col for col in cols if not col.endswith('close')]
-        df = df[cols_to_keep]
+        df = df.loc[:, ~df.columns.str.endswith('close')]
 
     return df
 
 
-def dfs_to_csv(df, output_file_path, verbose=False):
+def dfs_to_csv(df, output_file_path, num_header_rows=0, verbose=False):
+
+    written = False
+
+    if pa is not None:
+        # Write the column labels and header rows (e.g. period headers) with pandas, then append the data rows with Arrow in their native types
+        try:
+            df.iloc[:num_header_rows].to_csv(output_file_path, index=False)
+            table = pa.Table.from_pandas(df.iloc[num_header_rows:].infer_objects(), preserve_index=False)  # Header rows left numeric columns as objects
+            with open(output_file_path, 'ab') as file:
+                pa_csv.write_csv(table, file, pa_csv.WriteOptions(include_header=False))
+            written = True
+        except pa.ArrowException:
+            pass  # Fall back to pandas' writer below, which rewrites the whole file
 
-    df.to_csv(output_file_path, index=False)#, float_format="%.3f")
+    if not written:
+        df.to_csv(output_file_path, index=False)#, float_format="%.3f")
 
     if verbose:
         print(f" Data written to '{output_file_path}'.")
@@ -230,20 +466,20 @@ def main():
 
     dates = get_dates(args)
 
-    print("\nReading in data... ", end="")
+    print("\nReading in data... ", end="", flush=True)  # Line buffering won't flush a partial line
     tickers = open_and_read_tickers_file(args)
     print("done.")
     
     print("\nFetching and processing data...")
     dates = check_dates(dates)
-    df = get_prices(dates, tickers)
-    df = calculate_returns(df)
+    names, prices, column_labels = get_prices(dates, tickers, args.max_workers, args.async_fetch)
+    df = calculate_returns(tickers, names, prices, column_labels)
     df = append_period_headers(df)
     df = drop_close_prices(args, df)
     print("done.")
     
     print("\nWriting data to CSV file...")
-    dfs_to_csv(df, args.csv_output_filepath, verbose=True)
+    dfs_to_csv(df, args.csv_output_filepath, num_header_rows=1, verbose=True)  # First row holds the period headers
     print("done.")
 
     print("\nAll done. Exiting.\n\n")